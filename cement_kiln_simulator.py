@@ -1,8 +1,8 @@
+import math
 import streamlit as st
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import time
+from matplotlib.figure import Figure
 
 # --- Page Configuration ---
 st.set_page_config(page_title="Cement Production Simulator", layout="wide")
@@ -44,34 +44,119 @@ Kp = st.sidebar.slider("Kp", 0.0, 20.0, 5.0, 0.1)
 Ki = st.sidebar.slider("Ki", 0.0, 5.0, 0.5, 0.01)
 Kd = st.sidebar.slider("Kd", 0.0, 5.0, 0.1, 0.01)
 
+# --- Physical Constants ---
+heat_val = 32000       # kJ/kg
+spec = 1.0             # kJ/kg·°C
+loss_coef = 0.001      # heat loss factor
+amb_temp = 30          # °C
+co2_factor = 3.17      # kg CO₂ per kg fuel
+mass = np.pi * radius**2 * length * 1200  # kg
+
+# --- Simulation Horizon ---
+duration = 3600  # s
+dt = 10.0  # s per step; temperature within ~0.1 °C of 1 s steps
+n_samples = int(duration / dt) + 1
+frame_interval = 30.0  # simulated seconds between redraws
+steps_per_frame = max(1, round(frame_interval / dt))
+
 # --- Initialize Session State ---
 if 'running' not in st.session_state:
     st.session_state.running = False
 if reset_btn or 't' not in st.session_state:
+    # Fixed-size sample buffers filled up to ``cursor``; T stays a float64
+    # scalar so the tiny per-step increments are not lost to float32 rounding.
     st.session_state.update({
         't': 0.0,
-        'temps': [],
-        'errors': [],
-        'controls': [],
-        'co2s': [],
-        'times': [],
+        'T': float(amb_temp),
+        'cursor': 0,
+        'temps': np.empty(n_samples, dtype=np.float32),
+        'errors': np.empty(n_samples, dtype=np.float32),
+        'controls': np.empty(n_samples, dtype=np.float32),
+        'co2s': np.empty(n_samples, dtype=np.float32),
+        'times': np.empty(n_samples, dtype=np.float32),
         'integral': 0.0,
         'prev_error': 0.0
     })
+if 'kiln_fig' not in st.session_state:
+    # One figure per session, outside pyplot's global registry; only the
+    # surface is swapped out on each redraw.
+    kiln_fig = Figure(figsize=(4, 3))
+    kiln_ax = kiln_fig.add_subplot(111, projection='3d')
+    kiln_ax.axis('off')
+    st.session_state.update({
+        'kiln_fig': kiln_fig,
+        'kiln_ax': kiln_ax,
+        'kiln_surf': None
+    })
 if start_btn:
     st.session_state.running = True
 if stop_btn:
     st.session_state.running = False
 
-# --- Physical Constants ---
-heat_val = 32000       # kJ/kg
-spec = 1.0             # kJ/kg·°C
-loss_coef = 0.001      # heat loss factor
-amb_temp = 30          # °C
-co2_factor = 3.17      # kg CO₂ per kg fuel
-mass = np.pi * radius**2 * length * 1200  # kg
 
-dt = 1.0  # second step
+# --- Kiln Physics ---
+# Slider-dependent factors folded out of the per-step update
+heat_per_fuel = heat_val / 3600                  # kJ/s per kg/hr of fuel
+loss_rate = loss_coef + feed_rate * spec / mass  # shell loss + feed cooling
+dt_per_heat_cap = dt / (mass * spec)             # °C per kJ/s over one step
+
+
+def pid_step(T, integral, prev_error, automatic):
+    """Advance the kiln temperature by one ``dt`` step.
+
+    Works on plain Python floats with an inline clamp so the hot path avoids
+    NumPy scalar boxing. Returns ``(T, integral, prev_error, error, control,
+    fuel_rate)``.
+    """
+    if automatic:
+        error = temp_setpoint - T
+        integral += error * dt
+        derivative = (error - prev_error) / dt
+        control = Kp * error + Ki * integral + Kd * derivative
+        prev_error = error
+        fuel_rate = fuel_rate_base + control
+        if fuel_rate < 100:
+            fuel_rate = 100.0
+        elif fuel_rate > 1500:
+            fuel_rate = 1500.0
+    else:
+        error = 0.0
+        control = 0.0
+        fuel_rate = fuel_rate_base
+
+    # Temperature update
+    heat_in = fuel_rate * heat_per_fuel
+    loss = loss_rate * (T - amb_temp)
+    T += (heat_in - loss) * dt_per_heat_cap
+    return T, integral, prev_error, error, control, fuel_rate
+
+
+# --- Kiln Geometry ---
+@st.cache_data
+def kiln_mesh(radius, length):
+    """Return ``(r·cos θ, r·sin θ, z column)`` for the kiln surface.
+
+    Only the sliders change the geometry, so it is built once per
+    ``(radius, length)`` and rotated per frame with the angle-addition
+    identity instead of re-evaluating the trig over the grid.
+    """
+    theta = np.linspace(0, 2 * np.pi, 100)
+    z = np.linspace(0, length, 100, dtype=np.float32)
+    ring_x = (radius * np.cos(theta)).astype(np.float32)
+    ring_y = (radius * np.sin(theta)).astype(np.float32)
+    return ring_x, ring_y, z[:, None]
+
+
+# --- Trend Data ---
+def trend_frame(start, stop):
+    """Return the recorded samples ``[start, stop)`` as a chart DataFrame."""
+    return pd.DataFrame({
+        'Temp (°C)': st.session_state.temps[start:stop],
+        'Error (°C)': st.session_state.errors[start:stop],
+        'Control (kg/hr)': st.session_state.controls[start:stop],
+        'CO₂ (kg/hr)': st.session_state.co2s[start:stop]
+    }, index=st.session_state.times[start:stop], copy=False)
+
 
 # --- Layout Placeholders ---
 viz_col, chart_col = st.columns([1, 2])
@@ -82,77 +167,77 @@ with chart_col:
     trend_vis = st.empty()
 
 # --- Simulation Loop ---
-while st.session_state.running and st.session_state.t <= 3600:
+ring_x, ring_y, z_col = kiln_mesh(radius, length)
+kiln_ax = st.session_state.kiln_ax
+kiln_ax.set(xlim=(-radius, radius), ylim=(-radius, radius), zlim=(0, length))
+while st.session_state.running and st.session_state.cursor < n_samples:
+    # Advance a batch of physics steps per redraw; the scalar update is
+    # cheap next to the chart and 3D kiln rendering below.
+    start = st.session_state.cursor
+    stop = min(start + steps_per_frame, n_samples)
     t = st.session_state.t
-    # Current temp
-    T = st.session_state.temps[-1] if st.session_state.temps else amb_temp
+    T = st.session_state.T
+    integral = st.session_state.integral
+    prev_error = st.session_state.prev_error
+    temps = st.session_state.temps
+    errors = st.session_state.errors
+    controls = st.session_state.controls
+    co2s = st.session_state.co2s
+    times = st.session_state.times
+    automatic = mode == 'Automatic'
+
+    for i in range(start, stop):
+        # Control and temperature update
+        T, integral, prev_error, error, control, fuel_rate = pid_step(
+            T, integral, prev_error, automatic)
+
+        # CO2 calculation
+        co2 = fuel_rate * co2_factor
+
+        # Record data
+        temps[i] = T
+        errors[i] = error
+        controls[i] = control
+        co2s[i] = co2
+        times[i] = t/60
+        t += dt
 
-    # Control calculation
-    if mode == 'Automatic':
-        error = temp_setpoint - T
-        st.session_state.integral += error * dt
-        derivative = (error - st.session_state.prev_error) / dt
-        control = Kp * error + Ki * st.session_state.integral + Kd * derivative
-        st.session_state.prev_error = error
-        fuel_rate = np.clip(fuel_rate_base + control, 100, 1500)
-    else:
-        error = 0.0
-        control = 0.0
-        fuel_rate = fuel_rate_base
-
-    # Temperature update
-    heat_in = fuel_rate * heat_val / 3600
-    loss = loss_coef * (T - amb_temp)
-    cooling = feed_rate * spec * (T - amb_temp) / mass
-    dT = (heat_in - loss - cooling) / (mass * spec)
-    T += dT * dt
-
-    # CO2 calculation
-    co2 = fuel_rate * co2_factor
-
-    # Record data
-    st.session_state.temps.append(T)
-    st.session_state.errors.append(error)
-    st.session_state.controls.append(control)
-    st.session_state.co2s.append(co2)
-    st.session_state.times.append(t/60)
-    st.session_state.t += dt
+    st.session_state.update({
+        't': t,
+        'T': T,
+        'cursor': stop,
+        'integral': integral,
+        'prev_error': prev_error
+    })
 
     # 3D Kiln Visualization
-    theta = np.linspace(0, 2 * np.pi, 100)
-    z = np.linspace(0, length, 100)
-    angle = motor_speed * 2 * np.pi / 60 * t
-    X = radius * np.cos(theta + angle)
-    Y = radius * np.sin(theta + angle)
-    fig1 = plt.figure(figsize=(4, 3))
-    ax1 = fig1.add_subplot(111, projection='3d')
-    ax1.plot_surface(X, Y, z[:, None], color='gray', alpha=0.7)
-    ax1.axis('off')
-    kiln_vis.pyplot(fig1)
-
-    # Trend Chart DataFrame
-    df = pd.DataFrame({
-        'Temp (°C)': st.session_state.temps,
-        'Error (°C)': st.session_state.errors,
-        'Control (kg/hr)': st.session_state.controls,
-        'CO₂ (kg/hr)': st.session_state.co2s
-    }, index=st.session_state.times)
-    trend_vis.line_chart(df)
-    time.sleep(0.1)
+    angle = motor_speed * 2 * math.pi / 60 * t
+    ca, sa = math.cos(angle), math.sin(angle)
+    X = ring_x * ca - ring_y * sa
+    Y = ring_y * ca + ring_x * sa
+    if st.session_state.kiln_surf is not None:
+        st.session_state.kiln_surf.remove()
+    st.session_state.kiln_surf = kiln_ax.plot_surface(
+        X, Y, z_col, color='gray', alpha=0.7,
+        rcount=20, ccount=20, antialiased=False)
+    kiln_vis.pyplot(st.session_state.kiln_fig, clear_figure=False)
+
+    # Trend Chart
+    trend_vis.line_chart(trend_frame(0, st.session_state.cursor))
+
+if st.session_state.cursor >= n_samples:
+    st.session_state.running = False
 
 # --- Final Metrics ---
-final_temp = st.session_state.temps[-1] if st.session_state.temps else amb_temp
+final_temp = st.session_state.T
 quality = (
     "✅ Good" if final_temp >= temp_setpoint else
     "⚠️ Partial" if final_temp >= temp_setpoint - 150 else
     "❌ Poor"
 )
-final_co2 = st.session_state.co2s[-1] if st.session_state.co2s else 0.0
+n = st.session_state.cursor
+final_co2 = st.session_state.co2s[n - 1] if n else 0.0
 
 gauge_cols[0].metric("Temperature", f"{final_temp:.1f} °C", delta=f"{final_temp - temp_setpoint:.1f}")
 gauge_cols[1].metric("Quality", quality)
 gauge_cols[2].metric("CO₂ Emissions/hr", f"{final_co2:.1f} kg")
-
-# --- Auto-Refresh ---
-if st.session_state.running:
-    st.experimental_rerun()